@@ -1,4 +1,4 @@
-#!/usr/bin/env python
+#!/usr/bin/env python3
 
 # Copyright (c) 2013-2015, Rethink Robotics
 # All rights reserved.
@@ -31,10 +31,13 @@
 Baxter RSDK Inverse Kinematics Pick and Place Demo
 """
 import argparse
-import struct
+import csv
 import sys
-import copy
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import rospy
 import rospkg
 
@@ -52,7 +55,9 @@ from std_msgs.msg import (
     Header,
     Empty,
 )
+from sensor_msgs.msg import JointState
 
+from baxter_core_msgs.msg import EndEffectorState
 from baxter_core_msgs.srv import (
     SolvePositionIK,
     SolvePositionIKRequest,
@@ -60,16 +65,117 @@ from baxter_core_msgs.srv import (
 
 import baxter_interface
 
+try:
+    import optik
+except ImportError:
+    optik = None
+
+# Package paths, RosPack crawls the package index so look it up once
+_PKG_PATH = rospkg.RosPack().get_path('project4')
+_MODEL_PATH = _PKG_PATH + "/models/"
+_BLOCK1_PATH_CSV = _PKG_PATH + "/path/block1Poses.csv"
+_BLOCK2_PATH_CSV = _PKG_PATH + "/path/block2Poses.csv"
+
+# An orientation for gripper fingers to be overhead and parallel to the obj,
+# shared by every Pose built below
+OVERHEAD_ORIENTATION = Quaternion(
+                         x=-0.0249590815779,
+                         y=0.999649402929,
+                         z=0.00737916180073,
+                         w=0.00486450832011)
+
+def poses_from_coords(coords, orientation=OVERHEAD_ORIENTATION):
+    """Poses from an (N, 3) array of x,y,z, all sharing one orientation."""
+    return [Pose(position=Point(x=x, y=y, z=z), orientation=orientation)
+            for x, y, z in coords.tolist()]
+
+def _xyz_rows(filepath, f):
+    # csv rows of exactly x,y,z, skipping blank lines
+    for line, row in enumerate(csv.reader(f), 1):
+        if not row:
+            continue
+        if len(row) != 3:
+            raise ValueError("{0}:{1}: expected x,y,z, got {2} fields".format(
+                filepath, line, len(row)))
+        yield row
+
+def load_path(filepath, hover_distance, orientation=OVERHEAD_ORIENTATION):
+    """Waypoint poses from an x,y,z per line CSV and the hover poses above them."""
+    # stream the rows straight into the array, no list of lines or fields
+    with open(filepath, 'r', newline='') as f:
+        coords = np.fromiter((float(v) for row in _xyz_rows(filepath, f)
+                              for v in row),
+                             dtype=np.float64).reshape(-1, 3)
+    hover = coords.copy()
+    hover[:, 2] += hover_distance
+    return (poses_from_coords(coords, orientation),
+            poses_from_coords(hover, orientation))
+
+def pose_to_matrix(pose):
+    """Homogeneous 4x4 transform of a geometry_msgs Pose."""
+    x, y, z, w = (pose.orientation.x, pose.orientation.y,
+                  pose.orientation.z, pose.orientation.w)
+    return np.array([
+        [1 - 2*(y*y + z*z), 2*(x*y - z*w), 2*(x*z + y*w), pose.position.x],
+        [2*(x*y + z*w), 1 - 2*(x*x + z*z), 2*(y*z - x*w), pose.position.y],
+        [2*(x*z - y*w), 2*(y*z + x*w), 1 - 2*(x*x + y*y), pose.position.z],
+        [0.0, 0.0, 0.0, 1.0]])
+
+def quantize_quat(q, resolution_deg):
+    """Integer key of a Quaternion at roughly resolution_deg of rotation."""
+    # a rotation by theta moves quaternion components by about theta/2
+    step = math.radians(resolution_deg) / 2.0
+    return tuple(int(round(c / step)) for c in (q.x, q.y, q.z, q.w))
+
 class PickAndPlace(object):
-    def __init__(self, limb, hover_distance = 0.15, verbose=True):
+    # type of seed ultimately used by the IK service to get a solution
+    _SEED_STR = {
+                 SolvePositionIKRequest.SEED_USER: 'User Provided Seed',
+                 SolvePositionIKRequest.SEED_CURRENT: 'Current Joint Angles',
+                 SolvePositionIKRequest.SEED_NS_MAP: 'Nullspace Setpoints',
+                }
+    # every IK request is in the base frame, only the stamp changes
+    _hdr = Header(frame_id='base')
+    # lower and upper limits of the s0, s1, e0, e1, w0, w1, w2 joints
+    _JOINT_LIMITS = np.array([
+        [-1.7017, -2.147, -3.0542, -0.05, -3.059, -1.5708, -3.059],
+        [1.7017, 1.047, 3.0542, 2.618, 3.059, 2.094, 3.059]])
+    # squared reach around the shoulder (s1 joint) in the base frame,
+    # poses outside this shell are rejected without calling IK
+    _MAX_REACH2 = 1.21**2
+    _MIN_REACH2 = 0.10**2
+    # rospy ServiceException messages raised by a connect or read failure
+    _TRANSPORT_ERRORS = ("transport error", "unable to connect")
+
+    def __init__(self, limb, hover_distance = 0.15, verbose=True, urdf_path=None):
         self._limb_name = limb # string
         self._hover_distance = hover_distance # in meters
         self._verbose = verbose # bool
+        self._ik_cache = {} # quantized pose -> joint solution
+        self._last_solution = None # seed for the next IK solve
+        self._shoulder = (0.064, 0.259 if limb == 'left' else -0.259, 0.390)
         self._limb = baxter_interface.Limb(limb)
         self._gripper = baxter_interface.Gripper(limb)
+        # set by the gripper state callback once a commanded motion is over
+        self._gripper_moving = False
+        self._gripper_idle_evt = threading.Event()
+        self._gripper_sub = rospy.Subscriber(
+            "/robot/end_effector/" + limb + "_gripper/state",
+            EndEffectorState, self._on_gripper_state)
         ns = "ExternalTools/" + limb + "/PositionKinematicsNode/IKService"
-        self._iksvc = rospy.ServiceProxy(ns, SolvePositionIK)
+        self._iksvc_ns = ns
+        self._iksvc = rospy.ServiceProxy(ns, SolvePositionIK, persistent=True)
+        # the persistent connection is shared by all solving threads
+        self._iksvc_lock = threading.Lock()
+        # solves the next waypoint while the arm is moving
+        self._ik_executor = ThreadPoolExecutor(max_workers=1)
         rospy.wait_for_service(ns, 5.0)
+        # in-process IK solver, the IK service is only used as a fallback
+        self._solver = None
+        if optik is not None and urdf_path:
+            self._solver = optik.Robot.from_urdf_file(urdf_path, "base",
+                                                      limb + "_gripper")
+            self._solver_config = optik.SolverConfig(max_time=0.005)
         # verify robot is enabled
         print("Getting robot state... ")
         self._rs = baxter_interface.RobotEnable(baxter_interface.CHECK_VERSION)
@@ -83,40 +189,165 @@ class PickAndPlace(object):
             start_angles = dict(zip(self._joint_names, [0]*7))
         self._guarded_move_to_joint_position(start_angles)
         self.gripper_open()
-        rospy.sleep(1.0)
         print("Running. Ctrl-c to quit")
 
     def ik_request(self, pose):
-        hdr = Header(stamp=rospy.Time.now(), frame_id='base')
+        return self.ik_batch_request([pose])[0]
+
+    def _local_ik(self, pose, seed=None):
+        # Solve in-process, returns None if no solver or no solution
+        if self._solver is None:
+            return None
+        joint_names = self._limb.joint_names()
+        seed = seed or self._limb.joint_angles()
+        x0 = [seed[j] for j in joint_names]
+        sol = self._solver.ik(self._solver_config, pose_to_matrix(pose), x0)
+        if sol is None:
+            return None
+        if self._verbose:
+            print("IK Solution SUCCESS - Valid Joint Solution Found In-Process")
+        return dict(zip(joint_names, sol[0]))
+
+    def _reachable(self, pose):
+        sx, sy, sz = self._shoulder
+        d2 = ((pose.position.x - sx)**2 + (pose.position.y - sy)**2 +
+              (pose.position.z - sz)**2)
+        return self._MIN_REACH2 <= d2 <= self._MAX_REACH2
+
+    def _cache_key(self, pose):
+        # 1 cm position cells, 5 degree orientation cells
+        return (int(round(pose.position.x*100)),
+                int(round(pose.position.y*100)),
+                int(round(pose.position.z*100)),
+                quantize_quat(pose.orientation, 5.0))
+
+    def _call_iksvc(self, ikreq):
+        with self._iksvc_lock:
+            try:
+                return self._iksvc(ikreq)
+            except (rospy.ServiceException, rospy.exceptions.TransportException) as e:
+                # only a dropped connection is worth reconnecting for, an
+                # error from the service handler would just fail again;
+                # a broken socket raises TransportException on write and
+                # a transport error ServiceException on connect or read
+                if (isinstance(e, rospy.ServiceException) and
+                        not str(e).startswith(self._TRANSPORT_ERRORS)):
+                    raise
+                self._iksvc.close()
+                self._iksvc = rospy.ServiceProxy(self._iksvc_ns, SolvePositionIK,
+                                                 persistent=True)
+                return self._iksvc(ikreq)
+
+    def _seed_state(self, joint_angles):
+        # Limb joint dict or array in joint_names() order -> JointState seed
+        names = self._limb.joint_names()
+        if isinstance(joint_angles, dict):
+            joint_angles = [joint_angles[j] for j in names]
+        return JointState(name=names, position=list(joint_angles))
+
+    def _restart_seeds(self, pose):
+        # seeds the first solve did not try: zeros and a random configuration
+        # within the joint limits, the random one is deterministic per pose
+        p = pose.position
+        rng = np.random.default_rng(hash((p.x, p.y, p.z)) & 0xffffffff)
+        return [self._seed_state([0.0] * len(self._limb.joint_names())),
+                self._seed_state(rng.uniform(*self._JOINT_LIMITS))]
+
+    def _service_ik(self, poses, seeds=None, seed_mode=None):
+        # Solve every pose in a single service call, with one seed per pose
+        # if given; returns a solution or False per pose, None if the call failed
+        self._hdr.stamp = rospy.Time.now()
+        hdr = self._hdr
         ikreq = SolvePositionIKRequest()
-        ikreq.pose_stamp.append(PoseStamped(header=hdr, pose=pose))
+        ikreq.pose_stamp = [PoseStamped(header=hdr, pose=p) for p in poses]
+        if seeds is not None:
+            ikreq.seed_angles = seeds
+            ikreq.seed_mode = seed_mode
         try:
-            resp = self._iksvc(ikreq)
-        except (rospy.ServiceException, rospy.ROSException), e:
-            rospy.logerr("Service call failed: %s" % (e,))
-            return False
+            resp = self._call_iksvc(ikreq)
+        except (rospy.ServiceException, rospy.ROSException) as e:
+            rospy.logerr(f"Service call failed: {e}")
+            return None
         # Check if result valid, and type of seed ultimately used to get solution
-        # convert rospy's string representation of uint8[]'s to int's
-        resp_seeds = struct.unpack('<%dB' % len(resp.result_type), resp.result_type)
-        limb_joints = {}
-        if (resp_seeds[0] != resp.RESULT_INVALID):
-            seed_str = {
-                        ikreq.SEED_USER: 'User Provided Seed',
-                        ikreq.SEED_CURRENT: 'Current Joint Angles',
-                        ikreq.SEED_NS_MAP: 'Nullspace Setpoints',
-                       }.get(resp_seeds[0], 'None')
-            if self._verbose:
-                print("IK Solution SUCCESS - Valid Joint Solution Found from Seed Type: {0}".format(
-                         (seed_str)))
-            # Format solution into Limb API-compatible dictionary
-            limb_joints = dict(zip(resp.joints[0].name, resp.joints[0].position))
-            if self._verbose:
-                print("IK Joint Solution:\n{0}".format(limb_joints))
-                print("------------------")
-        else:
-            rospy.logerr("INVALID POSE - No Valid Joint Solution Found.")
-            return False
-        return limb_joints
+        # rospy hands uint8[] over as str/bytes, bytearray indexes them as ints
+        resp_seeds = bytearray(resp.result_type)
+        solutions = []
+        for j in range(len(poses)):
+            if (resp_seeds[j] != resp.RESULT_INVALID):
+                # Format solution into Limb API-compatible dictionary
+                limb_joints = dict(zip(resp.joints[j].name, resp.joints[j].position))
+                if self._verbose:
+                    seed_str = self._SEED_STR.get(resp_seeds[j], 'None')
+                    print("IK Solution SUCCESS - Valid Joint Solution Found from Seed Type: {0}".format(
+                             (seed_str)))
+                    print("IK Joint Solution:\n{0}".format(limb_joints))
+                    print("------------------")
+                solutions.append(limb_joints)
+            else:
+                solutions.append(False)
+        return solutions
+
+    def ik_batch_request(self, poses, seed=None):
+        # Solve every pose in a single service call; one result per pose,
+        # False wherever no valid solution was found. Solves start from seed
+        # if given, otherwise from the last solution, which they then update
+        chained = seed is None
+        if chained:
+            seed = self._last_solution
+        keys = [self._cache_key(p) for p in poses]
+        solutions = [self._ik_cache.get(k) for k in keys]
+        for i, sol in enumerate(solutions):
+            if sol is None and not self._reachable(poses[i]):
+                rospy.logerr("OUT OF REACH POSE - Skipping IK.")
+                solutions[i] = False
+            elif sol is None:
+                solutions[i] = self._local_ik(poses[i], seed)
+                if solutions[i] is not None:
+                    self._ik_cache[keys[i]] = solutions[i]
+                    if chained:
+                        self._last_solution = solutions[i]
+        pending = [i for i, sol in enumerate(solutions) if sol is None]
+        if not pending:
+            return solutions
+        seeds = None
+        if seed is not None:
+            seeds = [self._seed_state(seed)] * len(pending)
+        # SEED_AUTO tries the last solution first, then the current angles;
+        # an explicit seed is used alone so the result does not depend on
+        # wherever the arm happens to be
+        seed_mode = (SolvePositionIKRequest.SEED_AUTO if chained
+                     else SolvePositionIKRequest.SEED_USER)
+        results = self._service_ik([poses[i] for i in pending], seeds,
+                                   seed_mode)
+        if results is None:
+            for i in pending:
+                solutions[i] = False
+            return solutions
+        for i, sol in zip(pending, results):
+            solutions[i] = sol
+        failed = [i for i in pending if not solutions[i]]
+        if failed:
+            # restart every failed pose from several seeds in one request,
+            # the first valid seed wins
+            owners, restart_poses, restart_seeds = [], [], []
+            for i in failed:
+                for restart_seed in self._restart_seeds(poses[i]):
+                    owners.append(i)
+                    restart_poses.append(poses[i])
+                    restart_seeds.append(restart_seed)
+            results = self._service_ik(restart_poses, restart_seeds,
+                                       SolvePositionIKRequest.SEED_USER) or []
+            for i, sol in zip(owners, results):
+                if sol and not solutions[i]:
+                    solutions[i] = sol
+        for i in pending:
+            if solutions[i]:
+                self._ik_cache[keys[i]] = solutions[i]
+                if chained:
+                    self._last_solution = solutions[i]
+            else:
+                rospy.logerr("INVALID POSE - No Valid Joint Solution Found.")
+        return solutions
 
     def _guarded_move_to_joint_position(self, joint_angles):
         if joint_angles:
@@ -124,68 +355,106 @@ class PickAndPlace(object):
         else:
             rospy.logerr("No Joint Angles provided for move_to_joint_positions. Staying put.")
 
+    def _on_gripper_state(self, msg):
+        # moving is tri-state, STATE_UNKNOWN neither starts nor ends a motion
+        if msg.moving == EndEffectorState.STATE_TRUE:
+            self._gripper_moving = True
+        elif msg.moving == EndEffectorState.STATE_FALSE and self._gripper_moving:
+            self._gripper_moving = False
+            self._gripper_idle_evt.set()
+
+    def _command_gripper(self, command, target, timeout=1.0):
+        # wait until the gripper reports it stopped moving, timeout is the
+        # old fixed wait; nothing to wait for if already at target (0-100 %)
+        if abs(self._gripper.position() - target) < 2.0:
+            command()
+            return
+        self._gripper_moving = False
+        self._gripper_idle_evt.clear()
+        command()
+        self._gripper_idle_evt.wait(timeout)
+
     def gripper_open(self):
-        self._gripper.open()
-        rospy.sleep(1.0)
+        self._command_gripper(self._gripper.open, 100.0)
 
     def gripper_close(self):
-        self._gripper.close()
-        rospy.sleep(1.0)
+        self._command_gripper(self._gripper.close, 0.0)
 
-    def _approach(self, pose):
-        approach = copy.deepcopy(pose)
-        # approach with a pose the hover-distance above the requested pose
-        approach.position.z = approach.position.z + self._hover_distance
-        joint_angles = self.ik_request(approach)
-        self._guarded_move_to_joint_position(joint_angles)
+    def _hover_pose(self, pose):
+        # a pose the hover-distance above the requested pose, the orientation
+        # is never mutated so it is shared rather than copied
+        return Pose(
+            position=Point(pose.position.x, pose.position.y,
+                           pose.position.z + self._hover_distance),
+            orientation=pose.orientation)
 
-    def goTo(self, pose):
-        approach = copy.deepcopy(pose)
-        approach.position.z = approach.position.z +  self._hover_distance
-        joint_angles = self.ik_request(approach)
+    def goTo(self, joint_angles):
         self._guarded_move_to_joint_position(joint_angles)
 
+    def solve_path(self, posePath, hoverPath=None, seed=None):
+        # solve the hover pose above every waypoint, each seeded from the
+        # previous waypoint's solution so consecutive waypoints stay in the
+        # same arm configuration; returns a list of (pose, joint_angles)
+        if hoverPath is None:
+            hoverPath = [self._hover_pose(p_) for p_ in posePath]
+        solutions = []
+        for hover in hoverPath:
+            joint_angles = self.ik_batch_request([hover], seed)[0]
+            if joint_angles:
+                seed = joint_angles
+            solutions.append(joint_angles)
+        return list(zip(posePath, solutions))
+
     def _retract(self):
         # retrieve current pose from endpoint
         current_pose = self._limb.endpoint_pose()
-        ik_pose = Pose()
-        ik_pose.position.x = current_pose['position'].x
-        ik_pose.position.y = current_pose['position'].y
-        ik_pose.position.z = current_pose['position'].z + self._hover_distance
-        ik_pose.orientation.x = current_pose['orientation'].x
-        ik_pose.orientation.y = current_pose['orientation'].y
-        ik_pose.orientation.z = current_pose['orientation'].z
-        ik_pose.orientation.w = current_pose['orientation'].w
+        position = current_pose['position']
+        orientation = current_pose['orientation']
+        ik_pose = Pose(
+            position=Point(position.x, position.y,
+                           position.z + self._hover_distance),
+            orientation=Quaternion(orientation.x, orientation.y,
+                                   orientation.z, orientation.w))
         joint_angles = self.ik_request(ik_pose)
         # servo up from current pose
         self._guarded_move_to_joint_position(joint_angles)
 
-    def _servo_to_pose(self, pose):
-        # servo down to release
-        joint_angles = self.ik_request(pose)
-        self._guarded_move_to_joint_position(joint_angles)
-
     def pick(self, pose, posePath):
+        # posePath holds (pose, joint_angles) pairs from solve_path()
+        # solve approach and pose in one request, the retract goes back to
+        # the approach; a new target does not inherit the previous seed
+        self._last_solution = None
+        approach = self._hover_pose(pose)
+        solving = self._ik_executor.submit(self.ik_batch_request,
+                                           [approach, pose])
         # open the gripper
         self.gripper_open()
+        joint_angles = solving.result()
         # servo above pose
-        self._approach(pose)
+        self._guarded_move_to_joint_position(joint_angles[0])
         # servo to pose
-        self._servo_to_pose(pose)
+        self._guarded_move_to_joint_position(joint_angles[1])
         # close gripper
         self.gripper_close()
         # retract to clear object
-        self._retract()
-        for p_ in posePath:
+        self._guarded_move_to_joint_position(joint_angles[0])
+        for p_, angles in posePath:
             print("Came here")
-            self.goTo(p_)
+            self.goTo(angles)
+            if angles:
+                # seed later solves from where the arm actually is
+                self._last_solution = angles
         pass
 
     def place(self, pose):
+        approach = self._hover_pose(pose)
+        joint_angles = self.ik_request(approach)
+        # solve the servo pose while moving above pose
+        solving = self._ik_executor.submit(self.ik_request, pose)
         # servo above pose
-        self._approach(pose)
+        self._guarded_move_to_joint_position(joint_angles)
         # servo to pose
-        self._servo_to_pose(pose)
+        self._guarded_move_to_joint_position(solving.result())
         # open the gripper
         self.gripper_open()
         # retract to clear object
@@ -201,51 +470,57 @@ def load_gazebo_models(table_pose=Pose(position=Point(x=1.1, y=-0.2, z=0.0)),
                        wall_pose=Pose(position=Point(x=1.3, y=0.35, z=1)),
                        wall_reference_frame="world",):
     # Get Models' Path
-    model_path = rospkg.RosPack().get_path('project4')+"/models/"
+    model_path = _MODEL_PATH
     
     # Load Table SDF
     table_xml = ''
     with open (model_path + "cafe_table/model.sdf", "r") as table_file:
-        table_xml=table_file.read().replace('\n', '')
+        table_xml = table_file.read()
 
     # Load Block 1 URDF
     block1_xml = ''
     with open (model_path + "block/block1.urdf", "r") as block1_file:
-        block1_xml = block1_file.read().replace('\n', '')
+        block1_xml = block1_file.read()
     
     # Load block 2 URDF
     block2_xml = ''
     with open (model_path + "block/block2.urdf", "r") as block2_file:
-        block2_xml = block2_file.read().replace('\n', '')
+        block2_xml = block2_file.read()
     
     # Load wall obstacle
     wall_xml = ''
     with open (model_path + "wall/model.sdf", "r") as wall_file:
-        wall_xml = wall_file.read().replace('\n', '')
+        wall_xml = wall_file.read()
 
-    # Spawn Table SDF
     rospy.wait_for_service('/gazebo/spawn_sdf_model')
+    rospy.wait_for_service('/gazebo/spawn_urdf_model')
+    # gazebo_ros serves spawn requests one at a time, so the calls are made
+    # serially; the tables go first since the blocks rest on them
+    # Spawn Table SDF
     try:
-        spawn_sdf = rospy.ServiceProxy('/gazebo/spawn_sdf_model', SpawnModel)
+        spawn_sdf = rospy.ServiceProxy('/gazebo/spawn_sdf_model', SpawnModel,
+                                       persistent=True)
         resp_sdf = spawn_sdf("cafe_table_1", table_xml, "/",
                              table_pose, table_reference_frame)
         resp2_sdf = spawn_sdf("cafe_table_2", table_xml, "/",
                              table2_pose, table_reference_frame)
         sdf = spawn_sdf("wall", wall_xml, "/",
                                wall_pose, wall_reference_frame)
-    except rospy.ServiceException, e:
-        rospy.logerr("Spawn SDF service call failed: {0}".format(e))
-    
+        spawn_sdf.close()
+    except (rospy.ServiceException, rospy.ROSException) as e:
+        rospy.logerr(f"Spawn SDF service call failed: {e}")
+
     # Spawn Block URDF
-    rospy.wait_for_service('/gazebo/spawn_urdf_model')
     try:
-        spawn_urdf = rospy.ServiceProxy('/gazebo/spawn_urdf_model', SpawnModel)
+        spawn_urdf = rospy.ServiceProxy('/gazebo/spawn_urdf_model', SpawnModel,
+                                        persistent=True)
         resp1_urdf = spawn_urdf("block1", block1_xml, "/",
                                block1_pose, block1_reference_frame)
         resp2_urdf = spawn_urdf("block2", block2_xml, "/",
                                block2_pose, block2_reference_frame)
-    except rospy.ServiceException, e:
-        rospy.logerr("Spawn URDF service call failed: {0}".format(e))
+        spawn_urdf.close()
+    except (rospy.ServiceException, rospy.ROSException) as e:
+        rospy.logerr(f"Spawn URDF service call failed: {e}")
 
 def delete_gazebo_models():
     # This will be called on ROS Exit, deleting Gazebo models
@@ -253,11 +528,13 @@ def delete_gazebo_models():
     # Gazebo should already be running. If the service is not
     # available since Gazebo has been killed, it is fine to error out
     try:
-        delete_model = rospy.ServiceProxy('/gazebo/delete_model', DeleteModel)
+        delete_model = rospy.ServiceProxy('/gazebo/delete_model', DeleteModel,
+                                          persistent=True)
         resp_delete = delete_model("cafe_table")
         resp_delete = delete_model("block")
-    except rospy.ServiceException, e:
-        rospy.loginfo("Delete Model service call failed: {0}".format(e))
+        delete_model.close()
+    except rospy.ServiceException as e:
+        rospy.loginfo(f"Delete Model service call failed: {e}")
 
 def main():
     """RSDK Inverse Kinematics Pick and Place Example
@@ -297,62 +574,41 @@ def main():
                                  'left_e1': 1.9400238130755056,
                                  'left_s0': -0.08000397926829805,
                                  'left_s1': -0.9999781166910306}
-        pnp = PickAndPlace(limb, hover_distance)
-        # An orientation for gripper fingers to be overhead and parallel to the obj
-        overhead_orientation = Quaternion(
-                                 x=-0.0249590815779,
-                                 y=0.999649402929,
-                                 z=0.00737916180073,
-                                 w=0.00486450832011)
-        block1_poses = list()
-        block2_poses = list()
+        # Optional URDF for the in-process IK solver
+        urdf_path = rospy.get_param('~urdf_path', None)
+        pnp = PickAndPlace(limb, hover_distance, urdf_path=urdf_path)
         # block
-        allPoses_1, allPoses_2 = [],[]
-        filepath_1 = rospkg.RosPack().get_path('project4')+"/path/block1Poses.csv"
-        filepath_2 = rospkg.RosPack().get_path('project4')+"/path/block2Poses.csv"
-
-        with open(filepath_1,'r') as poseFile:
-            poses_ = poseFile.readlines()
-        poses = [p[:-1].split(",") for p in poses_]
-        for p in poses:
-            allPoses_1.append(Pose(
-                position = Point(x = float(p[0]), y = float(p[1]), z = float(p[2])),
-                orientation = overhead_orientation))
-
-
-        with open(filepath_2,'r') as poseFile:
-            poses_ = poseFile.readlines()
-        poses = [p[:-1].split(",") for p in poses_]
-        for p in poses:
-            allPoses_2.append(Pose(
-                position = Point(x = float(p[0]), y = float(p[1]), z = float(p[2])),
-                orientation = overhead_orientation))
-        # The Pose of the block in its initial location.
-        # You may wish to replace these poses with estimates
-        # from a perception node.
-        block1_poses.append(Pose(
-            position=Point(x=0.7, y=0.15, z=-0.129),
-            orientation=overhead_orientation))
-        # Feel free to add additional desired poses for the object.
-        # Each additional pose will get its own pick and place.
-        block1_poses.append(Pose(
-            position=Point(x=0.7, y=0.64, z=-0.129),
-            orientation=overhead_orientation))
-        # Move to the desired starting angles
+        allPoses_1, hoverPoses_1 = load_path(_BLOCK1_PATH_CSV, hover_distance)
+        allPoses_2, hoverPoses_2 = load_path(_BLOCK2_PATH_CSV, hover_distance)
 
         # The Pose of the block in its initial location.
         # You may wish to replace these poses with estimates
         # from a perception node.
-        block2_poses.append(Pose(
-            position=Point(x=0.7, y=0.76, z=-0.129),
-            orientation=overhead_orientation))
         # Feel free to add additional desired poses for the object.
         # Each additional pose will get its own pick and place.
-        block2_poses.append(Pose(
-            position=Point(x=0.68, y=0.0466, z=-0.129),
-            orientation=overhead_orientation))
+        block1_poses = [
+            Pose(position=Point(x=0.7, y=0.15, z=-0.129),
+                 orientation=OVERHEAD_ORIENTATION),
+            Pose(position=Point(x=0.7, y=0.64, z=-0.129),
+                 orientation=OVERHEAD_ORIENTATION),
+        ]
+        block2_poses = [
+            Pose(position=Point(x=0.7, y=0.76, z=-0.129),
+                 orientation=OVERHEAD_ORIENTATION),
+            Pose(position=Point(x=0.68, y=0.0466, z=-0.129),
+                 orientation=OVERHEAD_ORIENTATION),
+        ]
 
-        pnp.move_to_start(starting_joint_angles)
+        # Move to the desired starting angles
+        # Solve both paths while the arm moves to the starting angles
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            path_1 = executor.submit(pnp.solve_path, allPoses_1, hoverPoses_1,
+                                     starting_joint_angles)
+            path_2 = executor.submit(pnp.solve_path, allPoses_2, hoverPoses_2,
+                                     starting_joint_angles)
+            pnp.move_to_start(starting_joint_angles)
+            allPoses_1 = path_1.result()
+            allPoses_2 = path_2.result()
         idx1, idx2 = 0,0
         # while not rospy.is_shutdown():
         print("\nPicking...Red block")